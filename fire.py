@@ -1,28 +1,38 @@
 # FIRE Strategy Analyzer – Streamlit version with radar chart + your defaults
 
+import math
+
 import streamlit as st
 import numpy as np
 import pandas as pd
 
+MC_SEED = 42
+MC_TRIALS = 500
+MC_HORIZON = 40
+MC_SIGMA = 0.12  # annual real-return volatility
+
 # ======================
 # Helper functions
 # ======================
 def years_until(target, current):
     return max(0, target - current)
 
-def grow_balance(balance, years, r):
-    return balance * ((1+r)**years)
+def compound_growth(years, r):
+    # (1+r)**years - 1 without cancellation for small r*years
+    return math.expm1(years * math.log1p(r))
+
+def grow_balance(balance, g):
+    return balance * (1.0 + g)
 
-def fv_annuity(contrib, years, r):
+def fv_annuity(contrib, years, r, g):
+    """Future value of `years` annual contributions; g must be compound_growth(years, r)."""
     if years <= 0: return 0
-    return contrib * (((1+r)**years - 1) / r)
+    if r == 0: return contrib * years
+    return contrib * (g / r)
 
-def project(inputs):
-    yrs = years_until(inputs["target_retire_age"], inputs["current_age"])
-    total_now = sum(inputs["balances"].values())
-    grown_now = grow_balance(total_now, yrs, inputs["real_return"])
-    annual_contrib = sum(inputs["contributions"].values())
-    fv_contribs = fv_annuity(annual_contrib, yrs, inputs["real_return"])
+def project(total_now, annual_contrib, yrs, g, r):
+    grown_now = grow_balance(total_now, g)
+    fv_contribs = fv_annuity(annual_contrib, yrs, r, g)
     return {
         "years": yrs,
         "total_now": total_now,
@@ -30,241 +40,225 @@ def project(inputs):
         "annual_contrib": annual_contrib
     }
 
-def required(inputs):
-    yrs = years_until(inputs["target_retire_age"], inputs["current_age"])
-    spend = inputs["desired_retirement_expenses"] * ((1+inputs["inflation_rate"])**yrs)
+def required(inputs, infl_g):
+    spend = inputs["desired_retirement_expenses"] * (1.0 + infl_g)
     req = spend / inputs["safe_withdrawal_rate"]
     return {"spend_at_ret": spend, "required": req}
 
-def roth_ladder(inputs):
-    yrs = years_until(inputs["target_retire_age"], inputs["current_age"])
-    spend = required(inputs)["spend_at_ret"]
-    need = spend * inputs["taxable_bridge_years_required"]
-    avail = inputs["balances"]["taxable_investments"] + inputs["balances"]["cash_emergency"]
-    pct_covered = min(1, avail / need) if need > 0 else 1
-    return {
-        "Strategy": "Roth Conversion Ladder",
-        "Coverage %": pct_covered,
-        "Years Covered": avail / spend if spend > 0 else 0,
-        "Monte Carlo Success %": None,
-        "Status": "OK" if avail >= need else "SHORT"
-    }
-
-def sepp_72t(inputs):
-    pre_tax_total = inputs["balances"]["traditional_401k"] + inputs["balances"]["traditional_ira"]
-    annual_withdraw = 0.04 * pre_tax_total
-    spend = required(inputs)["spend_at_ret"]
-    pct_covered = min(1, annual_withdraw / spend) if spend > 0 else 0
-    return {
-        "Strategy": "72(t) SEPP",
-        "Coverage %": pct_covered,
-        "Years Covered": (annual_withdraw / spend) * 30 if spend > 0 else 0,
-        "Monte Carlo Success %": None,
-        "Status": "OK" if annual_withdraw >= spend else "SHORT"
-    }
-
-def taxable_first(inputs):
-    taxable_total = inputs["balances"]["taxable_investments"] + inputs["balances"]["cash_emergency"]
-    spend = required(inputs)["spend_at_ret"]
-    years_covered = taxable_total / spend if spend > 0 else 0
-    pct_covered = min(1, years_covered / 5)  # assume 5 years needed pre-59.5
-    return {
-        "Strategy": "Taxable Drawdown First",
-        "Coverage %": pct_covered,
-        "Years Covered": years_covered,
-        "Monte Carlo Success %": None,
-        "Status": "OK" if years_covered >= 5 else "SHORT"
-    }
-
-def monte_carlo(inputs, trials=500, horizon=40):
-    start = project(inputs)["nest_egg"]
-    spend = required(inputs)["spend_at_ret"]
-    annual_spend = spend
-    success = 0
-    for _ in range(trials):
-        bal = start
-        for yr in range(horizon):
-            r = np.random.normal(loc=inputs["real_return"], scale=0.12)
-            bal *= (1 + r)
-            bal -= annual_spend
-            if bal <= 0:
-                break
-        else:
-            success += 1
-    return success / trials
-
-def strategy_roth_ladder(inputs):
-    """Check if taxable/cash can cover the 5-year Roth ladder bridge."""
-    spend = required(inputs)["spend_at_ret"]
-    need = spend * inputs["taxable_bridge_years_required"]
-    avail = inputs["balances"]["taxable_investments"] + inputs["balances"]["cash_emergency"]
-    coverage = avail / need if need > 0 else 0
-    years = avail / spend if spend > 0 else 0
-    return coverage, years, "OK" if avail >= need else "SHORT"
-
-def strategy_sepp(inputs):
-    """72(t) Substantially Equal Periodic Payments from Traditional IRA/401k."""
-    spend = required(inputs)["spend_at_ret"]
-    balance = inputs["balances"]["traditional_401k"] + inputs["balances"]["traditional_ira"]
+@st.cache_data(max_entries=128)
+def monte_carlo(start, annual_spend, real_return, trials=MC_TRIALS, horizon=MC_HORIZON, seed=MC_SEED):
+    rng = np.random.default_rng(seed)
+    # one batched draw for every (trial, year) cell; only the years loop stays in Python.
+    # Antithetic pairs: the second half of the paths mirrors the first (Z, -Z).
+    half = (trials + 1) // 2
+    R = np.empty((trials, horizon), dtype=np.float32)
+    rng.standard_normal(dtype=np.float32, out=R[:half])
+    np.negative(R[:trials - half], out=R[half:])
+    np.multiply(R, MC_SIGMA, out=R)
+    np.add(R, 1.0 + real_return, out=R)  # growth factors 1 + r, scaled in place
+    # carry only surviving paths forward, so depleted ones stop compounding
+    alive = np.arange(trials)
+    bal = np.full(trials, start, dtype=np.float32)
+    for t in range(horizon):
+        bal = bal * R[alive, t] - annual_spend
+        keep = bal > 0
+        alive, bal = alive[keep], bal[keep]
+        if not alive.size:
+            break
+    return alive.size / trials
+
+@st.cache_data(max_entries=128)
+def success_probability(start, spend, real_return, horizon=MC_HORIZON, sigma=MC_SIGMA):
+    """Closed-form estimate of monte_carlo's success rate (no simulation)."""
+    if spend <= 0: return 1.0
+    if start <= 0: return 0.0
+    # The plan survives iff the present value of all withdrawals is below the
+    # starting balance. Model 1+r as lognormal with matching mean/variance and
+    # fit a lognormal to that present value S = sum_t prod_{k<=t} 1/(1+r_k).
+    s2 = math.log1p((sigma / (1 + real_return)) ** 2)
+    m = math.log1p(real_return) - s2 / 2
+    a = math.exp(-m + s2 / 2)      # E[1/(1+r)]
+    b = math.exp(-2 * m + 2 * s2)  # E[1/(1+r)^2]
+    t = np.arange(1, horizon + 1)
+    mean_s = (a ** t).sum()
+    mean_s2 = (b ** np.minimum.outer(t, t) * a ** np.abs(np.subtract.outer(t, t))).sum()
+    var_log = math.log(mean_s2 / mean_s ** 2)
+    z = (math.log(start / spend) - (math.log(mean_s) - var_log / 2)) / math.sqrt(var_log)
+    return 0.5 * math.erfc(-z / math.sqrt(2))
+
+def compare_strategies(spend, taxable, cash, trad_401k, trad_ira, bridge_years, success_prob, success_col):
+    """Coverage, years covered and status for every withdrawal strategy at once."""
+    bridge = taxable + cash
+    pre_tax = trad_401k + trad_ira
+    # rows: Roth ladder bridge, 72(t) SEPP, taxable drawdown
     # crude 72(t) calc: divide by life expectancy (IRS ~30 yrs for early retirees)
-    sepp_income = balance / 30  
-    coverage = sepp_income / spend
-    years = (balance / spend) if spend > 0 else 0
-    return coverage, years, "OK" if sepp_income >= spend else "SHORT"
-
-def strategy_taxable_drawdown(inputs):
-    """Draw taxable investments/cash until empty."""
-    spend = required(inputs)["spend_at_ret"]
-    avail = inputs["balances"]["taxable_investments"] + inputs["balances"]["cash_emergency"]
-    coverage = avail / spend if spend > 0 else 0
-    years = avail / spend if spend > 0 else 0
-    return coverage, years, "OK" if years >= 5 else "SHORT"  # needs ~5yr bridge
+    income = np.array([bridge, pre_tax / 30, bridge])
+    need = np.array([spend * bridge_years, spend, spend])
+    target = np.array([spend * bridge_years, spend, spend * 5])  # drawdown needs ~5yr bridge
+    coverage = np.divide(income, need, out=np.zeros(3), where=need > 0)
+    years = np.divide([bridge, pre_tax, bridge], spend, out=np.zeros(3), where=spend > 0)
+    return pd.DataFrame({
+        "Strategy": ["Roth Conversion Ladder", "72(t) SEPP", "Taxable Drawdown First"],
+        "Coverage %": coverage,
+        "Years Covered": years,
+        success_col: success_prob,
+        "Status": np.where(income >= target, "OK", "SHORT"),
+    })
 
 # ======================
 # Streamlit UI
 # ======================
-st.title("🔥 FIRE Strategy Analyzer")
-st.write("Estimate whether your savings, investments, and withdrawal strategy can support early retirement.")
-
-st.sidebar.header("Inputs (pre-filled with your data)")
-
-# ========== Defaults from your inputs ==========
-current_age = st.sidebar.number_input("Current age", 20, 70, 30)
-target_age = st.sidebar.number_input("Target retirement age", 30, 70, 50)
-expenses = st.sidebar.number_input("Current annual expenses ($)", 10000, 200000, 30000, step=1000)
-desired_expenses = st.sidebar.number_input("Target retirement annual expenses ($)", 10000, 200000, 60000, step=1000)
-income = st.sidebar.number_input("Gross annual income ($)", 20000, 500000, 100000, step=1000)
-
-st.sidebar.subheader("Annual Contributions")
-pre_tax_401k = st.sidebar.number_input("Pre-tax 401(k)", 0, 30000, 23500, step=500)
-roth_ira = st.sidebar.number_input("Roth IRA", 0, 6500, 0, step=500)
-hsa = st.sidebar.number_input("HSA", 0, 4000, 0, step=100)
-taxable = st.sidebar.number_input("Taxable investments", 0, 100000, 10000, step=500)
-cash = st.sidebar.number_input("Cash savings", 0, 50000, 20000, step=500)
-employer_match = st.sidebar.number_input("Employer 401(k) match", 0, 10000, 4000, step=500)
-
-st.sidebar.subheader("Current Balances")
-bal_trad_401k = st.sidebar.number_input("Traditional 401(k)", 0, 1000000, 100000, step=1000)
-bal_trad_ira = st.sidebar.number_input("Traditional IRA", 0, 1000000, 69000, step=1000)
-bal_roth = st.sidebar.number_input("Roth IRA", 0, 1000000, 69000, step=1000)
-bal_hsa = st.sidebar.number_input("HSA", 0, 100000, 20000, step=500)
-bal_taxable = st.sidebar.number_input("Taxable investments", 0, 1000000, 50000, step=1000)
-bal_cash = st.sidebar.number_input("Cash/emergency fund", 0, 100000, 20000, step=500)
-
-st.sidebar.subheader("Assumptions")
-real_return = st.sidebar.slider("Expected real return (%)", 0.0, 10.0, 5.0) / 100
-swr = st.sidebar.slider("Safe withdrawal rate (%)", 2.0, 6.0, 3.5) / 100
-infl = st.sidebar.slider("Inflation rate (%)", 0.0, 5.0, 3.0) / 100
-bridge_years = st.sidebar.slider("Taxable bridge years for Roth ladder", 0, 10, 3)
-
-inputs = {
-    "current_age": current_age,
-    "target_retire_age": target_age,
-    "current_yearly_expenses": expenses,
-    "desired_retirement_expenses": desired_expenses,
-    "inflation_rate": infl,
-    "gross_income": income,
-    "balances": {
-        "traditional_401k": bal_trad_401k,
-        "traditional_ira": bal_trad_ira,
-        "roth_ira": bal_roth,
-        "hsa": bal_hsa,
-        "taxable_investments": bal_taxable,
-        "cash_emergency": bal_cash,
-    },
-    "contributions": {
-        "pre_tax_401k": pre_tax_401k,
-        "roth_401k": 0,
-        "roth_ira": roth_ira,
-        "hsa": hsa,
-        "taxable_investments": taxable,
-        "cash_savings": cash,
-        "employer_match": employer_match,
-    },
-    "real_return": real_return,
-    "safe_withdrawal_rate": swr,
-    "plan_for_roth_ladder": True,
-    "taxable_bridge_years_required": bridge_years,
-    "safety_margin": 0.9,
-}
-
-# ======================
-# Run calculations
-# ======================
-proj = project(inputs)
-reqs = required(inputs)
-mc_prob = monte_carlo(inputs, trials=500)
-
-# Build withdrawal strategies dynamically
-coverage_rl, years_rl, status_rl = strategy_roth_ladder(inputs)
-coverage_sepp, years_sepp, status_sepp = strategy_sepp(inputs)
-coverage_tax, years_tax, status_tax = strategy_taxable_drawdown(inputs)
-
-strategies = [
-    {
-        "Strategy": "Roth Conversion Ladder",
-        "Coverage %": coverage_rl,
-        "Years Covered": years_rl,
-        "Monte Carlo Success %": mc_prob,
-        "Status": status_rl
-    },
-    {
-        "Strategy": "72(t) SEPP",
-        "Coverage %": coverage_sepp,
-        "Years Covered": years_sepp,
-        "Monte Carlo Success %": mc_prob,
-        "Status": status_sepp
-    },
-    {
-        "Strategy": "Taxable Drawdown First",
-        "Coverage %": coverage_tax,
-        "Years Covered": years_tax,
-        "Monte Carlo Success %": mc_prob,
-        "Status": status_tax
-    },
-]
-
-df_strategies = pd.DataFrame(strategies)
-
-status = "ON TRACK" if proj["nest_egg"] >= reqs["required"]*inputs["safety_margin"] else "UNDER-SAVING"
-
-# ======================
-# Output
-# ======================
-st.header("Results")
-st.metric("Years until retirement", proj["years"])
-st.metric("Projected nest egg", f"${proj['nest_egg']:,.0f}")
-st.metric("Required nest egg", f"${reqs['required']:,.0f}")
-st.metric("Overall Status", status)
-st.metric("Monte Carlo success rate", f"{mc_prob:.0%}")
-
-st.subheader("Withdrawal Strategies – Comparison")
-st.dataframe(df_strategies.set_index("Strategy"), use_container_width=True)
-
-# ======================
-# Strategy Comparison Bar Chart
-# ======================
-st.subheader("Strategy Metrics Comparison")
-
-# Convert Coverage % and Monte Carlo Success % into % scale
-df_plot = df_strategies.copy()
-df_plot["Coverage %"] = df_plot["Coverage %"] * 100
-df_plot["Monte Carlo Success %"] = df_plot["Monte Carlo Success %"] * 100
-
-# Melt to long format for easier plotting
-df_melted = df_plot.melt(id_vars="Strategy", 
-                         value_vars=["Coverage %", "Years Covered", "Monte Carlo Success %"],
-                         var_name="Metric", value_name="Value")
-
-st.bar_chart(df_melted, x="Strategy", y="Value", color="Metric")
-
-
-
-# ======================
-# Bar Charts
-# ======================
-balances = pd.Series(inputs["balances"])
-st.bar_chart(balances)
+def main():
+    st.title("🔥 FIRE Strategy Analyzer")
+    st.write("Estimate whether your savings, investments, and withdrawal strategy can support early retirement.")
+
+    st.sidebar.header("Inputs (pre-filled with your data)")
+
+    # ========== Defaults from your inputs ==========
+    current_age = st.sidebar.number_input("Current age", 20, 70, 30)
+    target_age = st.sidebar.number_input("Target retirement age", 30, 70, 50)
+    expenses = st.sidebar.number_input("Current annual expenses ($)", 10000, 200000, 30000, step=1000)
+    desired_expenses = st.sidebar.number_input("Target retirement annual expenses ($)", 10000, 200000, 60000, step=1000)
+    income = st.sidebar.number_input("Gross annual income ($)", 20000, 500000, 100000, step=1000)
+
+    st.sidebar.subheader("Annual Contributions")
+    pre_tax_401k = st.sidebar.number_input("Pre-tax 401(k)", 0, 30000, 23500, step=500)
+    roth_ira = st.sidebar.number_input("Roth IRA", 0, 6500, 0, step=500)
+    hsa = st.sidebar.number_input("HSA", 0, 4000, 0, step=100)
+    taxable = st.sidebar.number_input("Taxable investments", 0, 100000, 10000, step=500)
+    cash = st.sidebar.number_input("Cash savings", 0, 50000, 20000, step=500)
+    employer_match = st.sidebar.number_input("Employer 401(k) match", 0, 10000, 4000, step=500)
+
+    st.sidebar.subheader("Current Balances")
+    bal_trad_401k = st.sidebar.number_input("Traditional 401(k)", 0, 1000000, 100000, step=1000)
+    bal_trad_ira = st.sidebar.number_input("Traditional IRA", 0, 1000000, 69000, step=1000)
+    bal_roth = st.sidebar.number_input("Roth IRA", 0, 1000000, 69000, step=1000)
+    bal_hsa = st.sidebar.number_input("HSA", 0, 100000, 20000, step=500)
+    bal_taxable = st.sidebar.number_input("Taxable investments", 0, 1000000, 50000, step=1000)
+    bal_cash = st.sidebar.number_input("Cash/emergency fund", 0, 100000, 20000, step=500)
+
+    total_bal = bal_trad_401k + bal_trad_ira + bal_roth + bal_hsa + bal_taxable + bal_cash
+    total_contrib = pre_tax_401k + roth_ira + hsa + taxable + cash + employer_match
+
+    st.sidebar.subheader("Assumptions")
+    real_return = st.sidebar.slider("Expected real return (%)", 0.0, 10.0, 5.0) / 100
+    swr = st.sidebar.slider("Safe withdrawal rate (%)", 2.0, 6.0, 3.5) / 100
+    infl = st.sidebar.slider("Inflation rate (%)", 0.0, 5.0, 3.0) / 100
+    bridge_years = st.sidebar.slider("Taxable bridge years for Roth ladder", 0, 10, 3)
+    high_accuracy = st.sidebar.checkbox("High-accuracy Monte Carlo (slower)", False)
+
+    inputs = {
+        "current_age": current_age,
+        "target_retire_age": target_age,
+        "current_yearly_expenses": expenses,
+        "desired_retirement_expenses": desired_expenses,
+        "inflation_rate": infl,
+        "gross_income": income,
+        "balances": {
+            "traditional_401k": bal_trad_401k,
+            "traditional_ira": bal_trad_ira,
+            "roth_ira": bal_roth,
+            "hsa": bal_hsa,
+            "taxable_investments": bal_taxable,
+            "cash_emergency": bal_cash,
+        },
+        "contributions": {
+            "pre_tax_401k": pre_tax_401k,
+            "roth_401k": 0,
+            "roth_ira": roth_ira,
+            "hsa": hsa,
+            "taxable_investments": taxable,
+            "cash_savings": cash,
+            "employer_match": employer_match,
+        },
+        "real_return": real_return,
+        "safe_withdrawal_rate": swr,
+        "plan_for_roth_ladder": True,
+        "taxable_bridge_years_required": bridge_years,
+        "safety_margin": 0.9,
+    }
 
-contribs = pd.Series(inputs["contributions"])
-st.bar_chart(contribs)
+    # ======================
+    # Run calculations
+    # ======================
+    yrs = years_until(inputs["target_retire_age"], inputs["current_age"])
+    g = compound_growth(yrs, inputs["real_return"])
+    infl_g = compound_growth(yrs, inputs["inflation_rate"])
+
+    # per-session generator (Generators aren't thread-safe across Streamlit sessions);
+    # it hands out the MC seed so results stay reproducible across reruns
+    if "rng" not in st.session_state:
+        st.session_state.rng = np.random.default_rng(MC_SEED)
+        st.session_state.mc_seed = int(st.session_state.rng.integers(2**32))
+
+    proj = project(total_bal, total_contrib, yrs, g, inputs["real_return"])
+    reqs = required(inputs, infl_g)
+    spend = reqs["spend_at_ret"]
+    if high_accuracy:
+        # persist the MC result; rerun it only when its inputs change or on request
+        mc_args = (proj["nest_egg"], spend, inputs["real_return"])
+        if st.sidebar.button("Recompute Monte Carlo"):
+            # deliberately draw a new seed: Recompute resamples the paths, so the rate
+            # moves by sampling noise alone, not because any input changed
+            st.session_state.mc_seed = int(st.session_state.rng.integers(2**32))
+            st.session_state.pop("mc_args", None)
+        if st.session_state.get("mc_args") != mc_args:
+            st.session_state.mc_prob = monte_carlo(*mc_args, trials=MC_TRIALS,
+                                                   seed=st.session_state.mc_seed)
+            st.session_state.mc_args = mc_args
+        success_prob = st.session_state.mc_prob
+        success_label, success_col = "Monte Carlo success rate", "Monte Carlo Success %"
+    else:
+        success_prob = success_probability(proj["nest_egg"], spend, inputs["real_return"])
+        success_label, success_col = "Estimated success rate (closed-form)", "Estimated Success % (closed-form)"
+
+    # Build withdrawal strategies dynamically
+    df_strategies = compare_strategies(spend, bal_taxable, bal_cash, bal_trad_401k, bal_trad_ira,
+                                       bridge_years, success_prob, success_col)
+
+    status = "ON TRACK" if proj["nest_egg"] >= reqs["required"]*inputs["safety_margin"] else "UNDER-SAVING"
+
+    # ======================
+    # Output
+    # ======================
+    st.header("Results")
+    st.metric("Years until retirement", proj["years"])
+    st.metric("Projected nest egg", f"${proj['nest_egg']:,.0f}")
+    st.metric("Required nest egg", f"${reqs['required']:,.0f}")
+    st.metric("Overall Status", status)
+    st.metric(success_label, f"{success_prob:.0%}")
+
+    st.subheader("Withdrawal Strategies – Comparison")
+    st.dataframe(df_strategies.set_index("Strategy"), use_container_width=True)
+
+    # ======================
+    # Strategy Comparison Bar Chart
+    # ======================
+    st.subheader("Strategy Metrics Comparison")
+
+    # Convert Coverage % and the success rate into % scale
+    df_plot = df_strategies.copy()
+    df_plot["Coverage %"] = df_plot["Coverage %"] * 100
+    df_plot[success_col] = df_plot[success_col] * 100
+
+    # Melt to long format for easier plotting
+    df_melted = df_plot.melt(id_vars="Strategy", 
+                             value_vars=["Coverage %", "Years Covered", success_col],
+                             var_name="Metric", value_name="Value")
+
+    st.bar_chart(df_melted, x="Strategy", y="Value", color="Metric")
+
+
+
+    # ======================
+    # Bar Charts
+    # ======================
+    balances = pd.Series(inputs["balances"])
+    st.bar_chart(balances)
+
+    contribs = pd.Series(inputs["contributions"])
+    st.bar_chart(contribs)
+
+
+if __name__ == "__main__":
+    main()